@@ -3,15 +3,153 @@ AI Explainer using Groq API.
 Generates vulnerability explanations using Llama3 or Mixtral.
 """
 import os
-from typing import Dict, List
+import asyncio
+import re
+import time
+import hashlib
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import httpx
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
-def generate_ai_explanation(vulnerability: str, code_snippet: str) -> Dict[str, str]:
+
+# One long-lived HTTP/2 connection pool for every Groq call (explanations
+# here, fixes in main.py) — concurrent requests multiplex over a warm TLS
+# connection instead of opening new ones. Idle connections are kept well past
+# httpx's 5 s default, so calls a few seconds apart still find one open
+GROQ_MAX_CONNECTIONS = 64
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 32
+GROQ_KEEPALIVE_SECONDS = 120
+
+_http_client = DefaultAsyncHttpxClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GROQ_KEEPALIVE_SECONDS,
+    ),
+)
+client = AsyncGroq(api_key=GROQ_API_KEY, http_client=_http_client) if GROQ_API_KEY else None
+
+# Max in-flight Groq requests per enhance_findings_with_ai call
+MAX_CONCURRENT_REQUESTS = 10
+
+# Client-side pacing under Groq's requests-per-minute limit (free tier: 30),
+# so bursts queue here instead of tripping 429s and SDK retry backoff
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+_limiter = AsyncLimiter(max_rate=GROQ_REQUESTS_PER_MINUTE, time_period=60)
+
+# Circuit breaker: if most recent calls fail, stop calling Groq for a while
+BREAKER_WINDOW = 20          # recent calls considered
+BREAKER_FAILURE_RATE = 0.5   # open when more than half of them failed
+BREAKER_COOL_OFF = 60        # seconds to skip Groq once open
+
+_recent_calls: deque = deque(maxlen=BREAKER_WINDOW)   # True = success
+_breaker_open_until = 0.0
+
+# Findings packed into one prompt — amortises the instructions across several
+# findings; returns diminish (and answers get sloppier) much beyond this
+BATCH_SIZE = 5
+
+# One "[n] RISK: ... EXPLOIT: ... FIX: ..." block of a batched response
+_BATCH_BLOCK_RE = re.compile(
+    r'^\[(\d+)\]\s*RISK:(.*?)EXPLOIT:(.*?)FIX:(.*?)(?=^\[\d+\]|\Z)',
+    re.DOTALL | re.MULTILINE,
+)
+
+# In-process cache  {hash(type, snippet) -> explanation} — repos repeat the
+# same vulnerable idiom many times, so identical findings share one Groq call.
+# Bounded + expiring: its keys come from whatever repos users submit
+AI_CACHE_SIZE = 4096
+AI_CACHE_TTL_SECONDS = 3600
+_AI_CACHE: "TTLCache[str, Dict[str, str]]" = TTLCache(maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL_SECONDS)
+
+
+async def warm_connection() -> None:
+    """
+    Open the pooled connection to Groq ahead of the first real call, so no
+    user request pays the TLS handshake. Best-effort: errors are ignored.
+    """
+    if client is None:
+        return
+    try:
+        await _http_client.head(str(client.base_url))
+    except httpx.HTTPError:
+        pass
+
+
+async def close_connection() -> None:
+    """Close the pooled Groq connections (call once, on app shutdown)."""
+    await _http_client.aclose()
+
+
+def _breaker_allows_call() -> bool:
+    """False while the circuit is open (cooling off after repeated failures)."""
+    global _breaker_open_until
+    if _breaker_open_until and time.monotonic() >= _breaker_open_until:
+        # Cool-off over — start counting afresh
+        _breaker_open_until = 0.0
+        _recent_calls.clear()
+    return not _breaker_open_until
+
+
+def _record_call(ok: bool) -> None:
+    global _breaker_open_until
+    _recent_calls.append(ok)
+    if len(_recent_calls) == BREAKER_WINDOW:
+        failures = _recent_calls.count(False)
+        if failures > BREAKER_WINDOW * BREAKER_FAILURE_RATE:
+            _breaker_open_until = time.monotonic() + BREAKER_COOL_OFF
+
+
+def _unavailable() -> Dict[str, str]:
+    """Placeholder explanation while the circuit breaker is open."""
+    return {
+        "ai_risk": "AI explanation unavailable (Groq temporarily failing)",
+        "ai_exploit": "",
+        "ai_fix": ""
+    }
+
+
+async def _complete(prompt: str, max_tokens: int) -> Optional[str]:
+    """
+    Rate-limited Groq chat completion; outcome feeds the circuit breaker.
+
+    None if the breaker opened while this call was queued behind the limiter.
+    """
+    try:
+        async with _limiter:
+            if not _breaker_allows_call():
+                return None
+            response = await client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=[
+                    {"role": "system", "content": "You are a security expert. Be concise."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
+    except Exception:
+        _record_call(False)
+        raise
+    _record_call(True)
+    return response.choices[0].message.content.strip()
+
+
+def _cache_key(vulnerability: str, code_snippet: str) -> str:
+    """Key on exactly what the prompt sees: the type and first 200 chars of code."""
+    raw = f"{vulnerability}\0{code_snippet[:200]}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+async def generate_ai_explanation(vulnerability: str, code_snippet: str) -> Dict[str, str]:
     """Generate AI explanation for a vulnerability using Groq."""
     if not client:
         return {
@@ -20,6 +158,11 @@ def generate_ai_explanation(vulnerability: str, code_snippet: str) -> Dict[str,
             "ai_fix": ""
         }
     
+    cache_key = _cache_key(vulnerability, code_snippet)
+    cached = _AI_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
     prompt = f"""Analyze this security vulnerability in under 80 words total:
 
 Type: {vulnerability}
@@ -30,18 +173,13 @@ RISK: [Why this is dangerous - 1-2 sentences]
 EXPLOIT: [How attacker exploits it - 1-2 sentences]
 FIX: [Secure code fix example - brief]"""
 
+    if not _breaker_allows_call():
+        return _unavailable()
+
     try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a security expert. Be concise."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=200
-        )
-        
-        text = response.choices[0].message.content.strip()
+        text = await _complete(prompt, max_tokens=200)
+        if text is None:
+            return _unavailable()
         
         # Parse response
         result = {"ai_risk": "", "ai_exploit": "", "ai_fix": ""}
@@ -55,6 +193,7 @@ FIX: [Secure code fix example - brief]"""
             elif line.startswith('FIX:'):
                 result["ai_fix"] = line[4:].strip()
         
+        _AI_CACHE[cache_key] = result
         return result
         
     except Exception as e:
@@ -65,26 +204,117 @@ FIX: [Secure code fix example - brief]"""
         }
 
 
-def enhance_findings_with_ai(findings: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
-    """Add AI explanations to all findings."""
-    enhanced = {}
-    
+async def generate_ai_explanations_batch(items: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+    """Generate AI explanations for several (vulnerability, code_snippet) pairs in one Groq call."""
+    if len(items) == 1 or not client:
+        return [await generate_ai_explanation(vulnerability, code) for vulnerability, code in items]
+
+    results: List[Dict[str, str]] = [None] * len(items)
+    misses = []
+    for i, (vulnerability, code) in enumerate(items):
+        cached = _AI_CACHE.get(_cache_key(vulnerability, code))
+        if cached is not None:
+            results[i] = cached
+        else:
+            misses.append(i)
+
+    if not misses:
+        return results
+
+    listing = "\n".join(
+        f"[{n}] Type: {items[i][0]}\nCode: {items[i][1][:200]}"
+        for n, i in enumerate(misses, 1)
+    )
+    prompt = f"""Analyze these {len(misses)} security vulnerabilities, each in under 80 words total:
+
+{listing}
+
+Respond with one block per vulnerability, numbered to match, in exactly this format:
+[1] RISK: [Why this is dangerous - 1-2 sentences]
+EXPLOIT: [How attacker exploits it - 1-2 sentences]
+FIX: [Secure code fix example - brief]"""
+
+    try:
+        text = await _complete(prompt, max_tokens=200 * len(misses)) if _breaker_allows_call() else None
+        if text is None:
+            for i in misses:
+                results[i] = _unavailable()
+            return results
+
+        # Parse numbered blocks
+        for match in _BATCH_BLOCK_RE.finditer(text):
+            n = int(match.group(1))
+            if not 1 <= n <= len(misses):
+                continue
+            i = misses[n - 1]
+            result = {
+                "ai_risk": match.group(2).strip(),
+                "ai_exploit": match.group(3).strip(),
+                "ai_fix": match.group(4).strip(),
+            }
+            _AI_CACHE[_cache_key(*items[i])] = result
+            results[i] = result
+
+        error = "missing from batched response"
+
+    except Exception as e:
+        error = str(e)
+
+    for i in misses:
+        if results[i] is None:
+            results[i] = {
+                "ai_risk": f"AI explanation failed: {error[:50]}",
+                "ai_exploit": "",
+                "ai_fix": ""
+            }
+
+    return results
+
+
+async def enhance_findings_with_ai(findings: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    """
+    Add AI explanations to all findings (in place), running the Groq calls concurrently.
+
+    Each batch's explanations are merged as soon as it completes, so if the
+    caller cancels (e.g. on a timeout) the batches already done are kept.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    # One explanation per distinct (type, snippet) — duplicates share the result
+    unique: Dict[str, Tuple[str, str]] = {}
+    findings_by_key: Dict[str, List[Dict]] = {}
     for category, items in findings.items():
         if category == "_summary":
-            enhanced[category] = items
             continue
-            
-        enhanced[category] = []
         for finding in items:
             # Get code snippet from finding
             code = finding.get('code_snippet') or finding.get('matched') or finding.get('endpoint', '')
             vuln_type = finding.get('type') or finding.get('vulnerability', category)
-            
-            # Get AI explanation
-            ai_explanation = generate_ai_explanation(vuln_type, code)
-            
-            # Merge AI explanation into finding
-            enhanced_finding = {**finding, **ai_explanation}
-            enhanced[category].append(enhanced_finding)
-    
-    return enhanced
+            key = _cache_key(vuln_type, code)
+            unique.setdefault(key, (vuln_type, code))
+            findings_by_key.setdefault(key, []).append(finding)
+
+    async def explain(batch: List[str]) -> None:
+        async with semaphore:
+            try:
+                explanations = await generate_ai_explanations_batch([unique[key] for key in batch])
+            except Exception as e:
+                explanations = [{
+                    "ai_risk": f"AI explanation failed: {str(e)[:50]}",
+                    "ai_exploit": "",
+                    "ai_fix": ""
+                }] * len(batch)
+
+        # Merge into the findings (in place — findings are ours to enrich)
+        for key, ai_explanation in zip(batch, explanations):
+            for finding in findings_by_key[key]:
+                finding.update(ai_explanation)
+
+    # Pack them BATCH_SIZE to a prompt and send the batches concurrently
+    unique_keys = list(unique)
+    await asyncio.gather(*(
+        explain(unique_keys[i:i + BATCH_SIZE])
+        for i in range(0, len(unique_keys), BATCH_SIZE)
+    ))
+
+    return findings
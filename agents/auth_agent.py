@@ -1,91 +1,132 @@
 import re
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
+
+from utils.parallel import map_files
+from utils.pattern_set import PatternSet
 
 # Route patterns for different frameworks
 ROUTE_PATTERNS = [
     # FastAPI/Flask routes
-    (r'@(app|router)\.(get|post|put|delete|patch)\s*\(\s*["\'][^"\']*["\']', 'Python'),
+    (re.compile(r'@(app|router)\.(get|post|put|delete|patch)\s*\(\s*["\'][^"\']*["\']', re.IGNORECASE), 'Python'),
     # Express.js routes  
-    (r'(app|router)\.(get|post|put|delete|patch)\s*\(\s*["\'][^"\']+["\']', 'JavaScript'),
+    (re.compile(r'(app|router)\.(get|post|put|delete|patch)\s*\(\s*["\'][^"\']+["\']', re.IGNORECASE), 'JavaScript'),
     # NestJS/decorators
-    (r'@(Get|Post|Put|Delete|Patch)\s*\(\s*["\']?[^)]*["\']?\s*\)', 'TypeScript'),
+    (re.compile(r'@(Get|Post|Put|Delete|Patch)\s*\(\s*["\']?[^)]*["\']?\s*\)', re.IGNORECASE), 'TypeScript'),
 ]
 
-# Auth decorator/middleware patterns
-AUTH_PATTERNS = [
-    # Python decorators
-    r'@(require|login_required|authenticated|auth|jwt_required|token_required|permission|protected)',
-    r'@(Depends\s*\(\s*\w*auth|Depends\s*\(\s*\w*token|Depends\s*\(\s*get_current_user)',
-    # JS/TS middleware
-    r'(isAuthenticated|requireAuth|authMiddleware|verifyToken|authenticate)\s*[,\)]',
-    r'(passport\.authenticate|jwt\.verify)',
-    # Guards (NestJS)
-    r'@(UseGuards|AuthGuard)',
+# Lowercase keywords every match of the corresponding route pattern contains
+_ROUTE_METHODS = ('get', 'post', 'put', 'delete', 'patch')
+ROUTE_TRIGGERS = [
+    tuple('.' + method for method in _ROUTE_METHODS),
+    tuple('.' + method for method in _ROUTE_METHODS),
+    tuple('@' + method for method in _ROUTE_METHODS),
 ]
+ROUTE_SET = PatternSet([pattern for pattern, _ in ROUTE_PATTERNS], ROUTE_TRIGGERS)
+
+# Auth decorator/middleware patterns, fused into one alternation so the
+# context window around a route is scanned once instead of once per pattern
+AUTH_PATTERN = re.compile(
+    # Python decorators + Guards (NestJS), sharing the leading '@'
+    r'@(require|login_required|authenticated|auth|jwt_required|token_required|permission|protected'
+    r'|Depends\s*\(\s*\w*auth|Depends\s*\(\s*\w*token|Depends\s*\(\s*get_current_user'
+    r'|UseGuards|AuthGuard)'
+    # JS/TS middleware
+    r'|(isAuthenticated|requireAuth|authMiddleware|verifyToken|authenticate)\s*[,\)]'
+    r'|(passport\.authenticate|jwt\.verify)',
+    re.IGNORECASE,
+)
 
 # File-level auth middleware patterns (protects ALL routes in the file)
 FILE_LEVEL_AUTH_PATTERNS = [
-    r'router\.use\s*\(\s*(authenticate|authMiddleware|protect)',
-    r'app\.use\s*\(\s*(authenticate|authMiddleware|protect)',
+    re.compile(r'router\.use\s*\(\s*(authenticate|authMiddleware|protect)', re.IGNORECASE),
+    re.compile(r'app\.use\s*\(\s*(authenticate|authMiddleware|protect)', re.IGNORECASE),
 ]
 
 # Sensitive operations that should require auth
 SENSITIVE_OPS = [
-    r'(?i)(delete|remove|drop|update|create|insert|modify|admin|user|password|payment|checkout)',
+    re.compile(r'(?i)(delete|remove|drop|update|create|insert|modify|admin|user|password|payment|checkout)'),
 ]
 
+# HTTP methods that mutate state
+MUTATING_METHOD_PATTERN = re.compile(r'\.(post|put|delete|patch)', re.IGNORECASE)
+
 
-def detect_missing_auth(files: List[Dict]) -> List[Dict]:
-    """Scan files for endpoints potentially missing authentication."""
+def _line_window(content: str, start: int, end: int, before: int, after: int):
+    """Offsets spanning `before` lines above and `after` lines below content[start:end]."""
+    for _ in range(before):
+        if start == 0:
+            break
+        start = content.rfind('\n', 0, start - 1) + 1
+    for _ in range(after):
+        if end >= len(content):
+            break
+        next_end = content.find('\n', end + 1)
+        end = len(content) if next_end == -1 else next_end
+    return start, end
+
+
+def scan_file(file_info: Dict, candidates: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Scan one file for endpoints potentially missing authentication.
+
+    `candidates` are the ROUTE_SET.candidates() of the content, if already known.
+    """
     findings = []
-    
-    for file_info in files:
-        content = file_info['content']
-        
-        # Check for file-level auth middleware (e.g. router.use(authenticate))
-        file_has_auth = any(
-            re.search(pat, content, re.IGNORECASE)
-            for pat in FILE_LEVEL_AUTH_PATTERNS
-        )
-        if file_has_auth:
-            continue  # All routes in this file are authenticated
-        
-        lines = content.split('\n')
-        
-        for i, line in enumerate(lines):
-            line_num = i + 1
-            
-            # Check if this line defines a route
-            for route_pattern, framework in ROUTE_PATTERNS:
-                route_match = re.search(route_pattern, line, re.IGNORECASE)
-                if route_match:
-                    # Look for auth in surrounding context (5 lines before and after)
-                    context_start = max(0, i - 5)
-                    context_end = min(len(lines), i + 5)
-                    context = '\n'.join(lines[context_start:context_end])
-                    
-                    # Check if any auth pattern exists in context
-                    has_auth = any(re.search(auth_pat, context, re.IGNORECASE) 
-                                   for auth_pat in AUTH_PATTERNS)
-                    
-                    # Check if route handles sensitive operations
-                    is_sensitive = any(re.search(sens_pat, line, re.IGNORECASE) 
-                                       for sens_pat in SENSITIVE_OPS)
-                    
-                    # Flag if no auth and either: POST/PUT/DELETE/PATCH or sensitive op
-                    method_match = re.search(r'\.(post|put|delete|patch)', line, re.IGNORECASE)
-                    is_mutating = method_match is not None
-                    
-                    if not has_auth and (is_mutating or is_sensitive):
-                        severity = 'HIGH' if is_sensitive else 'MEDIUM'
-                        findings.append({
-                            'file': file_info['path'],
-                            'line': line_num,
-                            'type': 'Missing Authentication',
-                            'severity': severity,
-                            'endpoint': route_match.group(0)[:80],
-                            'framework': framework,
-                            'explanation': f"This endpoint appears to lack authentication middleware. {'It performs sensitive operations that should require authentication.' if is_sensitive else 'Mutating endpoints (POST/PUT/DELETE/PATCH) should typically require authentication.'}"
-                        })
-    
+    content = file_info['content']
+
+    # One pass over the whole file to find which route patterns can match
+    if candidates is None:
+        candidates = ROUTE_SET.candidates(content)
+    if not candidates:
+        return findings  # No routes in this file
+    route_patterns = [ROUTE_PATTERNS[i] for i in candidates]
+
+    # Check for file-level auth middleware (e.g. router.use(authenticate))
+    file_has_auth = any(
+        pat.search(content)
+        for pat in FILE_LEVEL_AUTH_PATTERNS
+    )
+    if file_has_auth:
+        return findings  # All routes in this file are authenticated
+
+    # Patterns run over content[start:end] via pos/endpos — no per-line copies
+    for line_num, start, end in ROUTE_SET.candidate_lines(content, candidates):
+        # Check if this line defines a route
+        for route_pattern, framework in route_patterns:
+            route_match = route_pattern.search(content, start, end)
+            if route_match:
+                # Check if route handles sensitive operations
+                is_sensitive = any(sens_pat.search(content, start, end)
+                                   for sens_pat in SENSITIVE_OPS)
+
+                # POST/PUT/DELETE/PATCH
+                method_match = MUTATING_METHOD_PATTERN.search(content, start, end)
+                is_mutating = method_match is not None
+
+                # Only mutating or sensitive routes get flagged — skip the auth scan otherwise
+                if not (is_mutating or is_sensitive):
+                    continue
+
+                # Look for auth in surrounding context (5 lines before and after)
+                context_start, context_end = _line_window(content, start, end, before=5, after=4)
+                has_auth = AUTH_PATTERN.search(content, context_start, context_end) is not None
+
+                # Flag if no auth
+                if not has_auth:
+                    severity = 'HIGH' if is_sensitive else 'MEDIUM'
+                    findings.append({
+                        'file': file_info['path'],
+                        'line': line_num,
+                        'type': 'Missing Authentication',
+                        'severity': severity,
+                        'endpoint': route_match.group(0)[:80],
+                        'framework': framework,
+                        'explanation': f"This endpoint appears to lack authentication middleware. {'It performs sensitive operations that should require authentication.' if is_sensitive else 'Mutating endpoints (POST/PUT/DELETE/PATCH) should typically require authentication.'}"
+                    })
+
     return findings
+
+
+def detect_missing_auth(files: List[Dict]) -> Iterator[Dict]:
+    """Scan files for endpoints potentially missing authentication, yielding findings as each file is scanned."""
+    yield from map_files(scan_file, files)
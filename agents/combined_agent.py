@@ -0,0 +1,47 @@
+"""
+All three detectors in one pass per file.
+
+Run separately, each agent walks every file on its own: three pool
+round-trips per file (each pickling its content), and three RE2::Set scans
+of the same text. Here each file goes to a worker once, one combined
+RE2::Set over every agent's patterns finds which of them can match, and
+only the agents with candidates scan it further.
+"""
+import logging
+from typing import Dict, Iterator, List
+
+from utils.parallel import map_each
+from utils.pattern_set import PatternSetGroup
+from agents import auth_agent, secrets_agent, sql_agent
+
+logger = logging.getLogger("security-auditor")
+
+# Findings key -> (agent's pattern set, agent's per-file scan)
+AGENT_SCANS = {
+    "secrets_detected": (secrets_agent.SECRET_SET, secrets_agent.scan_file),
+    "sql_injection": (sql_agent.SQL_SET, sql_agent.scan_file),
+    "missing_auth": (auth_agent.ROUTE_SET, auth_agent.scan_file),
+}
+_GATE = PatternSetGroup([pattern_set for pattern_set, _ in AGENT_SCANS.values()])
+
+
+def scan_file_all(file_info: Dict) -> Dict[str, List[Dict]]:
+    """Scan one file with every agent, returning {findings key: findings}."""
+    found = {}
+    per_agent = _GATE.candidates(file_info['content'])
+    for (name, (_, scan_file)), candidates in zip(AGENT_SCANS.items(), per_agent):
+        if not candidates:
+            found[name] = []
+            continue
+        try:
+            found[name] = scan_file(file_info, candidates)
+        except Exception as exc:
+            # One failing agent shouldn't sink the others' results
+            logger.warning("Agent %s failed on %s: %s", name, file_info['path'], exc)
+            found[name] = []
+    return found
+
+
+def detect_all(files: List[Dict]) -> Iterator[Dict[str, List[Dict]]]:
+    """Scan files with every agent, yielding each file's findings by key, in file order."""
+    yield from map_each(scan_file_all, files)
@@ -1,4 +1,8 @@
 import os
+import asyncio
+import hashlib
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import google.generativeai as genai
 from typing import Dict, List
@@ -9,8 +13,28 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# Max in-flight Gemini requests per enhance_findings_with_ai call
+MAX_CONCURRENT_REQUESTS = 10
 
-def get_ai_explanation(vuln_type: str, code_snippet: str) -> Dict[str, str]:
+# Client-side pacing under Gemini's requests-per-minute limit (free tier: 15)
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+_limiter = AsyncLimiter(max_rate=GEMINI_REQUESTS_PER_MINUTE, time_period=60)
+
+# In-process cache  {hash(type, snippet) -> explanation} — repos repeat the
+# same vulnerable idiom many times, so identical findings share one Gemini call.
+# Bounded + expiring: its keys come from whatever repos users submit
+AI_CACHE_SIZE = 4096
+AI_CACHE_TTL_SECONDS = 3600
+_AI_CACHE: "TTLCache[str, Dict[str, str]]" = TTLCache(maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL_SECONDS)
+
+
+def _cache_key(vuln_type: str, code_snippet: str) -> str:
+    """Key on exactly what the prompt sees: the type and first 200 chars of code."""
+    raw = f"{vuln_type}\0{code_snippet[:200]}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+async def get_ai_explanation(vuln_type: str, code_snippet: str) -> Dict[str, str]:
     """Get AI explanation for a vulnerability from Gemini."""
     if not GEMINI_API_KEY:
         return {
@@ -19,6 +43,11 @@ def get_ai_explanation(vuln_type: str, code_snippet: str) -> Dict[str, str]:
             "ai_fix": ""
         }
     
+    cache_key = _cache_key(vuln_type, code_snippet)
+    cached = _AI_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
     prompt = f"""Analyze this security vulnerability in under 80 words total:
 
 Type: {vuln_type}
@@ -31,7 +60,8 @@ FIX: [Secure code fix example - brief]"""
 
     try:
         model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
+        async with _limiter:
+            response = await model.generate_content_async(prompt)
         text = response.text.strip()
         
         # Parse response
@@ -46,6 +76,7 @@ FIX: [Secure code fix example - brief]"""
             elif line.startswith('FIX:'):
                 result["ai_fix"] = line[4:].strip()
         
+        _AI_CACHE[cache_key] = result
         return result
         
     except Exception as e:
@@ -56,22 +87,47 @@ FIX: [Secure code fix example - brief]"""
         }
 
 
-def enhance_findings_with_ai(findings: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
-    """Add AI explanations to all findings."""
-    enhanced = {}
-    
-    for category, items in findings.items():
-        enhanced[category] = []
-        for finding in items:
-            # Get code snippet from finding
-            code = finding.get('code_snippet') or finding.get('matched') or finding.get('endpoint', '')
-            vuln_type = finding.get('type') or finding.get('vulnerability', category)
-            
-            # Get AI explanation
-            ai_explanation = get_ai_explanation(vuln_type, code)
-            
-            # Merge AI explanation into finding
-            enhanced_finding = {**finding, **ai_explanation}
-            enhanced[category].append(enhanced_finding)
+async def enhance_findings_with_ai(findings: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    """Add AI explanations to all findings (in place), running the Gemini calls concurrently."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def explain(vuln_type: str, code: str) -> Dict[str, str]:
+        async with semaphore:
+            return await get_ai_explanation(vuln_type, code)
+
+    pending = [
+        (category, finding)
+        for category, items in findings.items()
+        for finding in items
+    ]
+
+    # One request per distinct (type, snippet) — duplicates share the result
+    unique: Dict[str, tuple] = {}
+    keys = []
+    for category, finding in pending:
+        # Get code snippet from finding
+        code = finding.get('code_snippet') or finding.get('matched') or finding.get('endpoint', '')
+        vuln_type = finding.get('type') or finding.get('vulnerability', category)
+        key = _cache_key(vuln_type, code)
+        unique.setdefault(key, (vuln_type, code))
+        keys.append(key)
+
+    results = await asyncio.gather(
+        *(explain(vuln_type, code) for vuln_type, code in unique.values()),
+        return_exceptions=True,
+    )
+    by_key = dict(zip(unique, results))
+    explanations = [by_key[key] for key in keys]
+
+    for (category, finding), ai_explanation in zip(pending, explanations):
+        if isinstance(ai_explanation, BaseException):
+            ai_explanation = {
+                "ai_risk": f"AI explanation failed: {str(ai_explanation)[:50]}",
+                "ai_exploit": "",
+                "ai_fix": ""
+            }
+
+        # Merge AI explanation into finding (in place — findings are ours to enrich)
+        finding.update(ai_explanation)
     
-    return enhanced
+    return findings
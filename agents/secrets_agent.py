@@ -1,41 +1,76 @@
 import re
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 
-# Patterns for detecting hardcoded secrets
+from utils.parallel import map_files
+from utils.pattern_set import PatternSet
+
+# Patterns for detecting hardcoded secrets (compiled once at import)
 SECRET_PATTERNS = [
-    (r'(?i)(api[_-]?key|apikey)\s*[=:]\s*["\'][a-zA-Z0-9]{16,}["\']', 'API Key'),
-    (r'(?i)(secret|password|passwd|pwd)\s*[=:]\s*["\'][^"\']{8,}["\']', 'Password/Secret'),
-    (r'(?i)(token|auth[_-]?token|access[_-]?token)\s*[=:]\s*["\'][a-zA-Z0-9_\-\.]{20,}["\']', 'Token'),
-    (r'(?i)AKIA[0-9A-Z]{16}', 'AWS Access Key'),
-    (r'(?i)(aws[_-]?secret|secret[_-]?key)\s*[=:]\s*["\'][a-zA-Z0-9/+=]{40}["\']', 'AWS Secret Key'),
-    (r'-----BEGIN\s+(RSA\s+)?PRIVATE\s+KEY-----', 'Private Key'),
-    (r'(?i)(mysql|postgres|mongodb|redis)://[^"\'\s]+:[^"\'\s]+@', 'Database Connection String'),
-    (r'(?i)bearer\s+[a-zA-Z0-9_\-\.]{20,}', 'Bearer Token'),
-    (r'ghp_[a-zA-Z0-9]{36}', 'GitHub Personal Access Token'),
-    (r'sk-[a-zA-Z0-9]{48}', 'OpenAI API Key'),
+    (re.compile(r'(?i)(api[_-]?key|apikey)\s*[=:]\s*["\'][a-zA-Z0-9]{16,}["\']'), 'API Key'),
+    (re.compile(r'(?i)(secret|password|passwd|pwd)\s*[=:]\s*["\'][^"\']{8,}["\']'), 'Password/Secret'),
+    (re.compile(r'(?i)(token|auth[_-]?token|access[_-]?token)\s*[=:]\s*["\'][a-zA-Z0-9_\-\.]{20,}["\']'), 'Token'),
+    (re.compile(r'(?i)AKIA[0-9A-Z]{16}'), 'AWS Access Key'),
+    (re.compile(r'(?i)(aws[_-]?secret|secret[_-]?key)\s*[=:]\s*["\'][a-zA-Z0-9/+=]{40}["\']'), 'AWS Secret Key'),
+    (re.compile(r'-----BEGIN\s+(RSA\s+)?PRIVATE\s+KEY-----'), 'Private Key'),
+    (re.compile(r'(?i)(mysql|postgres|mongodb|redis)://[^"\'\s]+:[^"\'\s]+@'), 'Database Connection String'),
+    (re.compile(r'(?i)bearer\s+[a-zA-Z0-9_\-\.]{20,}'), 'Bearer Token'),
+    (re.compile(r'ghp_[a-zA-Z0-9]{36}'), 'GitHub Personal Access Token'),
+    (re.compile(r'sk-[a-zA-Z0-9]{48}'), 'OpenAI API Key'),
+]
+
+# Lowercase keywords every match of the corresponding pattern contains —
+# without re2, files and lines lacking all of them skip the regexes
+SECRET_TRIGGERS = [
+    ('api',),
+    ('secret', 'passw', 'pwd'),
+    ('token',),
+    ('akia',),
+    ('secret',),
+    ('-----begin',),
+    ('://',),
+    ('bearer',),
+    ('ghp_',),
+    ('sk-',),
 ]
-def detect_secrets(files: List[Dict]) -> List[Dict]:
-    """Scan files for hardcoded secrets."""
+SECRET_SET = PatternSet([pattern for pattern, _ in SECRET_PATTERNS], SECRET_TRIGGERS)
+
+
+def scan_file(file_info: Dict, candidates: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Scan one file for hardcoded secrets.
+
+    `candidates` are the SECRET_SET.candidates() of the content, if already known.
+    """
     findings = []
-    for file_info in files:
-        content = file_info['content']
-        lines = content.split('\n')
-        
-        for line_num, line in enumerate(lines, 1):
-            for pattern, secret_type in SECRET_PATTERNS:
-                matches = re.finditer(pattern, line)
-                for match in matches:
-                    # Mask the actual secret value
-                    matched_text = match.group(0)
-                    masked = matched_text[:10] + '***REDACTED***'
-                    
-                    findings.append({
-                        'file': file_info['path'],
-                        'line': line_num,
-                        'type': secret_type,
-                        'severity': 'HIGH',
-                        'matched': masked,
-                        'explanation': f"Potential {secret_type} found. Hardcoded secrets should be stored in environment variables or a secrets manager."
-                    })
-    
+    content = file_info['content']
+
+    # One pass over the whole file to find which patterns can match at all
+    if candidates is None:
+        candidates = SECRET_SET.candidates(content)
+    if not candidates:
+        return findings
+    patterns = [SECRET_PATTERNS[i] for i in candidates]
+
+    for line_num, start, end in SECRET_SET.candidate_lines(content, candidates):
+        line = content[start:end]
+        for pattern, secret_type in patterns:
+            for match in pattern.finditer(line):
+                # Mask the actual secret value
+                matched_text = match.group(0)
+                masked = matched_text[:10] + '***REDACTED***'
+
+                findings.append({
+                    'file': file_info['path'],
+                    'line': line_num,
+                    'type': secret_type,
+                    'severity': 'HIGH',
+                    'matched': masked,
+                    'explanation': f"Potential {secret_type} found. Hardcoded secrets should be stored in environment variables or a secrets manager."
+                })
+
     return findings
+
+
+def detect_secrets(files: List[Dict]) -> Iterator[Dict]:
+    """Scan files for hardcoded secrets, yielding findings as each file is scanned."""
+    yield from map_files(scan_file, files)
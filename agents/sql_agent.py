@@ -1,66 +1,103 @@
 import re
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 
-# Patterns for detecting SQL injection vulnerabilities
+from utils.parallel import map_files
+from utils.pattern_set import PatternSet
+
+# Patterns for detecting SQL injection vulnerabilities (compiled once at import).
+# Lazy `.*?` runs that are followed by another `.*?` sit in atomic groups
+# (?>...): the earliest match is always good enough there, so the group never
+# needs revisiting, and long lines can't backtrack polynomially through them.
+# Atomic groups need Python 3.11+ (pinned in .python-version)
 SQL_PATTERNS = [
     # String concatenation with SQL keywords
-    (r'(?i)(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE)\s+.*\+\s*[a-zA-Z_][a-zA-Z0-9_]*', 
+    (re.compile(r'(?i)(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE)\s+.*\+\s*[a-zA-Z_][a-zA-Z0-9_]*'), 
      'String concatenation in SQL query'),
     
     # f-strings with SQL
-    (r'(?i)f["\'].*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+.*?\{[^}]+\}.*?["\']',
+    (re.compile(r'(?i)f["\'](?>.*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+)(?>.*?\{[^}]+\}).*?["\']'),
      'f-string interpolation in SQL query'),
     
     # .format() with SQL
-    (r'(?i)["\'].*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+.*?["\']\.format\s*\(',
+    (re.compile(r'(?i)["\'](?>.*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+).*?["\']\.format\s*\('),
      '.format() in SQL query'),
     
     # % formatting with SQL
-    (r'(?i)["\'].*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+.*?%s.*?["\'].*?%',
+    (re.compile(r'(?i)["\'](?>.*?(SELECT|INSERT|UPDATE|DELETE|DROP)\s+)(?>.*?%s)(?>.*?["\']).*?%'),
      '% formatting in SQL query'),
     
     # execute() with string concatenation
-    (r'(?i)\.execute\s*\(\s*["\'].*?\+',
+    (re.compile(r'(?i)\.execute\s*\(\s*["\'].*?\+'),
      'String concatenation in execute()'),
     
     # cursor.execute with f-string
-    (r'(?i)\.execute\s*\(\s*f["\']',
+    (re.compile(r'(?i)\.execute\s*\(\s*f["\']'),
      'f-string in execute()'),
     
     # query() with user input patterns
-    (r'(?i)\.query\s*\(\s*["\'].*?\$\{',
+    (re.compile(r'(?i)\.query\s*\(\s*["\'].*?\$\{'),
      'Template literal with variable in query()'),
     
     # Raw query with concatenation (JS/TS)
-    (r'(?i)(raw|query)\s*\(\s*`.*?\$\{',
+    (re.compile(r'(?i)(raw|query)\s*\(\s*`.*?\$\{'),
      'Template literal interpolation in raw query'),
 ]
 
+# Lowercase keywords every match of the corresponding pattern contains —
+# without re2, files and lines lacking all of them skip the regexes
+_SQL_KEYWORDS = ('select', 'insert', 'update', 'delete', 'drop')
+SQL_TRIGGERS = [
+    _SQL_KEYWORDS + ('create',),
+    _SQL_KEYWORDS,
+    ('.format',),
+    ('%s',),
+    ('.execute',),
+    ('.execute',),
+    ('.query',),
+    ('${',),
+]
+SQL_SET = PatternSet([pattern for pattern, _ in SQL_PATTERNS], SQL_TRIGGERS)
+
+
+def scan_file(file_info: Dict, candidates: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Scan one file for potential SQL injection vulnerabilities.
 
-def detect_sql_injection(files: List[Dict]) -> List[Dict]:
-    """Scan files for potential SQL injection vulnerabilities."""
+    `candidates` are the SQL_SET.candidates() of the content, if already known.
+    """
     findings = []
-    
-    for file_info in files:
-        content = file_info['content']
-        lines = content.split('\n')
-        
-        for line_num, line in enumerate(lines, 1):
-            # Skip comments
-            stripped = line.strip()
-            if stripped.startswith('#') or stripped.startswith('//') or stripped.startswith('*'):
-                continue
-            
-            for pattern, vuln_type in SQL_PATTERNS:
-                if re.search(pattern, line):
-                    findings.append({
-                        'file': file_info['path'],
-                        'line': line_num,
-                        'type': 'SQL Injection',
-                        'severity': 'CRITICAL',
-                        'code_snippet': line.strip()[:100],
-                        'vulnerability': vuln_type,
-                        'explanation': f"{vuln_type} detected. Use parameterized queries or prepared statements instead of string interpolation to prevent SQL injection attacks."
-                    })
-    
+    content = file_info['content']
+
+    # One pass over the whole file to find which patterns can match at all
+    if candidates is None:
+        candidates = SQL_SET.candidates(content)
+    if not candidates:
+        return findings
+    patterns = [SQL_PATTERNS[i] for i in candidates]
+
+    for line_num, start, end in SQL_SET.candidate_lines(content, candidates):
+        line = content[start:end]
+
+        # Skip comments
+        stripped = line.strip()
+        if stripped.startswith('#') or stripped.startswith('//') or stripped.startswith('*'):
+            continue
+
+        for pattern, vuln_type in patterns:
+            if pattern.search(line):
+                findings.append({
+                    'file': file_info['path'],
+                    'line': line_num,
+                    'type': 'SQL Injection',
+                    'severity': 'CRITICAL',
+                    'code_snippet': line.strip()[:100],
+                    'vulnerability': vuln_type,
+                    'explanation': f"{vuln_type} detected. Use parameterized queries or prepared statements instead of string interpolation to prevent SQL injection attacks."
+                })
+
     return findings
+
+
+def detect_sql_injection(files: List[Dict]) -> Iterator[Dict]:
+    """Scan files for potential SQL injection vulnerabilities, yielding findings as each file is scanned."""
+    yield from map_files(scan_file, files)
@@ -3,7 +3,7 @@ Comparison Testing Script
 Compares our LangGraph security auditor against Bandit and Semgrep.
 """
 import os
-import subprocess
+import asyncio
 import json
 from pathlib import Path
 from graph_workflow import run_security_graph_single
@@ -11,6 +11,9 @@ from graph_workflow import run_security_graph_single
 # Test samples directory
 SAMPLES_DIR = Path(__file__).parent / "test_samples"
 
+# Cap on tool invocations running at once — all files and tools run concurrently
+MAX_CONCURRENT_TOOLS = os.cpu_count() or 1
+
 
 def run_our_tool(filepath: Path) -> int:
     """Run our LangGraph auditor on a file."""
@@ -28,47 +31,72 @@ def run_our_tool(filepath: Path) -> int:
     return total
 
 
-def run_bandit(filepath: Path) -> int:
+async def _run_json_tool(args: list, timeout: int) -> dict:
+    """Run a CLI tool and parse its JSON stdout ({} when there is none)."""
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return json.loads(stdout) if stdout else {}
+
+
+async def run_bandit(filepath: Path) -> int:
     """Run Bandit on a Python file."""
     if not filepath.suffix == '.py':
         return -1  # Bandit only works on Python
     
     try:
-        result = subprocess.run(
-            ['bandit', '-f', 'json', '-q', str(filepath)],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        if result.stdout:
-            data = json.loads(result.stdout)
-            return len(data.get('results', []))
-        return 0
+        data = await _run_json_tool(['bandit', '-f', 'json', '-q', str(filepath)], timeout=30)
+        return len(data.get('results', []))
     except FileNotFoundError:
         return -2  # Bandit not installed
     except Exception:
         return 0
 
 
-def run_semgrep(filepath: Path) -> int:
+async def run_semgrep(filepath: Path) -> int:
     """Run Semgrep with auto rules on a file."""
     try:
-        result = subprocess.run(
-            ['semgrep', '--config', 'auto', '--json', '-q', str(filepath)],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        if result.stdout:
-            data = json.loads(result.stdout)
-            return len(data.get('results', []))
-        return 0
+        data = await _run_json_tool(['semgrep', '--config', 'auto', '--json', '-q', str(filepath)], timeout=60)
+        return len(data.get('results', []))
     except FileNotFoundError:
         return -2  # Semgrep not installed
     except Exception:
         return 0
 
 
+async def process_file(filepath: Path, semaphore: asyncio.Semaphore) -> dict:
+    """Run all three tools on one file concurrently."""
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+
+    our_count, bandit_count, semgrep_count = await asyncio.gather(
+        limited(asyncio.to_thread(run_our_tool, filepath)),
+        limited(run_bandit(filepath)),
+        limited(run_semgrep(filepath))
+    )
+    return {
+        'file': filepath.name,
+        'our_tool': our_count,
+        'bandit': bandit_count,
+        'semgrep': semgrep_count
+    }
+
+
+async def run_all(test_files: list) -> list:
+    """Process every file concurrently; results come back in input order."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOLS)
+    return await asyncio.gather(*(process_file(fp, semaphore) for fp in test_files))
+
+
 def main():
     print("=" * 70)
     print("SECURITY TOOL COMPARISON TEST")
@@ -86,25 +114,20 @@ def main():
                  list(SAMPLES_DIR.glob("*.js")) + \
                  list(SAMPLES_DIR.glob("*.ts"))
     
-    for filepath in sorted(test_files):
-        filename = filepath.name
-        
-        # Run our tool
-        our_count = run_our_tool(filepath)
+    # Run our tool, Bandit (Python only) and Semgrep on every file at once
+    for r in asyncio.run(run_all(sorted(test_files))):
+        our_count = r['our_tool']
+        bandit_count = r['bandit']
+        semgrep_count = r['semgrep']
+
         our_total += our_count
-        
-        # Run Bandit (Python only)
-        bandit_count = run_bandit(filepath)
         if bandit_count >= 0:
             bandit_total += bandit_count
-        
-        # Run Semgrep
-        semgrep_count = run_semgrep(filepath)
         if semgrep_count >= 0:
             semgrep_total += semgrep_count
         
         results.append({
-            'file': filename,
+            'file': r['file'],
             'our_tool': our_count,
             'bandit': bandit_count if bandit_count >= 0 else 'N/A',
             'semgrep': semgrep_count if semgrep_count >= 0 else 'N/A'
@@ -2,77 +2,117 @@
 LangGraph orchestration layer for security agents.
 Wraps existing agents into a graph workflow.
 """
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import Graph, END
+import hashlib
+import threading
+from typing import TypedDict, Annotated, List, Dict, Any
+from cachetools import LRUCache
+from langgraph.graph import StateGraph, START, END
 
-# Import existing agent logic
-from agents.secrets_agent import detect_secrets
-from agents.sql_agent import detect_sql_injection
-from agents.auth_agent import detect_missing_auth
+# Import existing agent logic — every agent, fused into one pass per file
+from agents.combined_agent import AGENT_SCANS, detect_all
 
 
-# Shared state schema
+def merge_findings(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer: merge a node's findings keys into the accumulated findings."""
+    return {**current, **update}
+
+
+# Shared state schema — nodes return only their delta, LangGraph merges it
 class SecurityState(TypedDict):
     files: List[Dict]  # List of {path, content, extension}
-    findings: Dict[str, List[Dict]]  # Aggregated findings
+    findings: Annotated[Dict[str, List[Dict]], merge_findings]  # Aggregated findings
 
 
-# Node functions - wrap existing agents
-def secrets_node(state: SecurityState) -> SecurityState:
-    """Run secrets detection agent."""
-    findings = detect_secrets(state["files"])
-    state["findings"]["secrets_detected"] = findings
-    return state
+# Per-file findings of every agent, LRU-bounded so a stream of distinct
+# repos can't grow memory without limit
+FILE_FINDINGS_CACHE_SIZE = 20_000
+
+# {(path, blake2b(content)) -> {findings key -> findings for that file}}
+_file_findings_cache: "LRUCache[tuple, Dict[str, List[Dict]]]" = LRUCache(maxsize=FILE_FINDINGS_CACHE_SIZE)
+_file_findings_lock = threading.Lock()
 
 
-def sql_node(state: SecurityState) -> SecurityState:
-    """Run SQL injection detection agent."""
-    findings = detect_sql_injection(state["files"])
-    state["findings"]["sql_injection"] = findings
-    return state
+def _detect_cached(files):
+    """
+    Run the agents on only the files whose (path, content) they haven't seen.
+
+    Re-auditing a repo — or a new revision of one — only re-scans the files
+    that changed; unchanged files reuse their cached findings.
+    """
+    keys = [
+        (f['path'], hashlib.blake2b(f['content'].encode(), digest_size=16).digest())
+        for f in files
+    ]
+
+    per_file = {}
+    with _file_findings_lock:
+        for key in keys:
+            cached = _file_findings_cache.get(key)
+            if cached is not None:
+                per_file[key] = cached
+
+    misses = {}
+    for key, f in zip(keys, files):
+        if key not in per_file:
+            misses.setdefault(key, f)
+
+    if misses:
+        # One call for all misses, so it can still fan out across processes
+        found = dict(zip(misses, detect_all(list(misses.values()))))
+
+        with _file_findings_lock:
+            for key, file_findings in found.items():
+                per_file[key] = _file_findings_cache[key] = file_findings
+
+    # Copies, so later enrichment of the findings never touches the cache
+    return {
+        name: [dict(finding) for key in keys for finding in per_file[key][name]]
+        for name in AGENT_SCANS
+    }
+
 
+# Node functions - wrap existing agents
+def detectors_node(state: SecurityState) -> Dict[str, Any]:
+    """
+    Run every detection agent over the files in a single pass per file.
 
-def auth_node(state: SecurityState) -> SecurityState:
-    """Run missing auth detection agent."""
-    findings = detect_missing_auth(state["files"])
-    state["findings"]["missing_auth"] = findings
-    return state
+    A single agent's failure on a file only drops that agent's findings for
+    it; anything else propagates — empty results would read as a clean repo.
+    """
+    return {"findings": _detect_cached(state["files"])}
 
 
-def aggregator_node(state: SecurityState) -> SecurityState:
+def aggregator_node(state: SecurityState) -> Dict[str, Any]:
     """Aggregate and finalize findings."""
     # Count totals
     total = sum(len(f) for f in state["findings"].values())
-    state["findings"]["_summary"] = {
+    return {"findings": {"_summary": {
         "total_findings": total,
         "secrets_count": len(state["findings"].get("secrets_detected", [])),
         "sql_count": len(state["findings"].get("sql_injection", [])),
         "auth_count": len(state["findings"].get("missing_auth", []))
-    }
-    return state
+    }}}
 
 
 # Build the graph
-def build_security_graph() -> Graph:
+def build_security_graph():
     """Build LangGraph workflow for security scanning."""
-    workflow = Graph()
+    workflow = StateGraph(SecurityState)
     
-    # Add nodes
-    workflow.add_node("secrets_agent", secrets_node)
-    workflow.add_node("sql_agent", sql_node)
-    workflow.add_node("auth_agent", auth_node)
+    # Define flow: start → detectors (secrets + sql + auth, fused per file) → aggregator → end
+    workflow.add_node("detectors", detectors_node)
     workflow.add_node("aggregator", aggregator_node)
-    
-    # Define flow: start → secrets → sql → auth → aggregator → end
-    workflow.set_entry_point("secrets_agent")
-    workflow.add_edge("secrets_agent", "sql_agent")
-    workflow.add_edge("sql_agent", "auth_agent")
-    workflow.add_edge("auth_agent", "aggregator")
+    workflow.add_edge(START, "detectors")
+    workflow.add_edge("detectors", "aggregator")
     workflow.add_edge("aggregator", END)
     
     return workflow.compile()
 
 
+# Compiled once and reused — the graph is stateless between invocations
+_security_graph = build_security_graph()
+
+
 # Main entry point
 def run_security_graph(files: List[Dict]) -> Dict[str, List[Dict]]:
     """
@@ -94,9 +134,8 @@ def run_security_graph(files: List[Dict]) -> Dict[str, List[Dict]]:
         }
     }
     
-    # Build and run graph
-    graph = build_security_graph()
-    final_state = graph.invoke(initial_state)
+    # Run graph
+    final_state = _security_graph.invoke(initial_state)
     
     return final_state["findings"]
 
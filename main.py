@@ -4,29 +4,29 @@ import time
 import hashlib
 import logging
 import asyncio
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, List, Any
-from groq import Groq
 
-from utils.repo_handler import clone_repo, cleanup_repo
+from utils.repo_handler import clone_repo_async, cleanup_repo
 from utils.file_scanner import scan_files
-from agents.secrets_agent import detect_secrets
-from agents.sql_agent import detect_sql_injection
-from agents.auth_agent import detect_missing_auth
-from agents.ai_explainer import enhance_findings_with_ai
+from utils.parallel import shutdown_pool
+from graph_workflow import run_security_graph
+from agents import ai_explainer
+from agents.ai_explainer import enhance_findings_with_ai, warm_connection, close_connection
 
 # Load .env so GROQ_API_KEY is available
 load_dotenv()
 
-# Groq client for /generate-fix
-_GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-_groq_client = Groq(api_key=_GROQ_API_KEY) if _GROQ_API_KEY else None
+# The explainer's shared AsyncGroq client, or None without GROQ_API_KEY
+_groq_client = ai_explainer.client
 
 
 # ---------------------------------------------------------------------------
@@ -39,10 +39,14 @@ logger = logging.getLogger("security-auditor")
 # Constants
 # ---------------------------------------------------------------------------
 CLONE_FAIL_MSG = "Unable to scan this repository. Try another public repository."
+SCAN_FAIL_MSG = "The security scan could not be completed. Please try again later."
 CLONE_TIMEOUT_SECONDS = 120  # generous clone timeout
 
-# Thread pool — 3 workers lets agents run in parallel
-_executor = ThreadPoolExecutor(max_workers=3)
+# Thread pool for blocking work (file scan + detection), installed as the event loop's
+# default executor so every asyncio.to_thread call shares it. Size per
+# uvicorn worker process via THREAD_POOL_SIZE.
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "3"))
+_executor = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="scan")
 
 # ---------------------------------------------------------------------------
 # App
@@ -63,6 +67,32 @@ app.add_middleware(
 )
 
 
+# ---------------------------------------------------------------------------
+# Lifecycle — the worker pools live for the whole process
+# ---------------------------------------------------------------------------
+@app.on_event("startup")
+async def install_default_executor():
+    asyncio.get_running_loop().set_default_executor(_executor)
+
+
+@app.on_event("startup")
+async def warm_groq_connection():
+    # In the background — startup shouldn't wait on the network
+    app.state.groq_warmup = asyncio.create_task(warm_connection())
+
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    _executor.shutdown(wait=False)
+    shutdown_pool()
+
+
+@app.on_event("shutdown")
+async def close_groq_connection():
+    app.state.groq_warmup.cancel()  # no-op once the warm-up has finished
+    await close_connection()
+
+
 # ---------------------------------------------------------------------------
 # Global exception handler — never leak stack traces
 # ---------------------------------------------------------------------------
@@ -114,60 +144,30 @@ def generate_summary(findings: Dict[str, List]) -> Dict[str, int]:
         'missing_auth': 0,
     }
 
+    # One pass: count raw severities, lowercase once per distinct value after
+    severities = Counter()
     for category, items in findings.items():
         summary['total_findings'] += len(items)
         summary[category] = len(items)
+        severities.update(item.get('severity', 'MEDIUM') for item in items)
 
-        for item in items:
-            severity = item.get('severity', 'MEDIUM').lower()
-            if severity in summary:
-                summary[severity] += 1
+    for severity, count in severities.items():
+        severity = severity.lower()
+        if severity in summary:
+            summary[severity] += count
 
     return summary
 
 
-def _run_agents_parallel(files):
-    """
-    Run all three detection agents in parallel and merge results.
-    """
-    from concurrent.futures import ThreadPoolExecutor as _TPE, as_completed
-
-    tasks = {
-        'secrets_detected': detect_secrets,
-        'sql_injection': detect_sql_injection,
-        'missing_auth': detect_missing_auth,
-    }
-    findings = {}
-
-    with _TPE(max_workers=3) as pool:
-        futures = {pool.submit(fn, files): name for name, fn in tasks.items()}
-        for fut in as_completed(futures):
-            name = futures[fut]
-            try:
-                findings[name] = fut.result()
-            except Exception as exc:
-                logger.warning("Agent %s failed: %s", name, exc)
-                findings[name] = []
-
-    return findings
-
-
-def _blocking_scan(repo_url: str):
+def _blocking_scan(repo_path: str):
     """
-    Clone → scan → detect pipeline (blocking).
-
-    GUARANTEE: If clone succeeds, this function NEVER raises.
-    It always returns a valid result dict with partial results.
+    Scan → detect pipeline over an already-cloned repo (blocking).
 
-    Only raises if clone itself fails.
+    GUARANTEE: this function NEVER raises.
+    It always returns a valid result dict with partial results — or, if the
+    detectors themselves failed, {"repo_path", "scan_failed": True}.
     """
-    repo_path = None
-
-    # ── STEP 1: Clone (this CAN raise) ──────────────────────────
-    repo_path = clone_repo(repo_url)
-    logger.info("CLONE SUCCESS: %s", repo_url)
-
-    # ── STEP 2: Everything after clone is wrapped — NEVER fails ─
+    # Everything after clone is wrapped — NEVER fails
     try:
         # Scan files
         scan_result = scan_files(repo_path)
@@ -188,14 +188,14 @@ def _blocking_scan(repo_url: str):
                 "scan_notice": "No supported source files (.py, .js, .ts) found in initial scan window.",
             }
 
-        # Run security agents in parallel
-        findings = _run_agents_parallel(files)
-
-        # AI explanations — graceful degradation
+        # Run security agents (one pass per file, cached per file)
         try:
-            findings = enhance_findings_with_ai(findings)
-        except Exception as ai_err:
-            logger.warning("AI explanation failed, returning raw findings: %s", ai_err)
+            findings = run_security_graph(files)
+        except Exception as detect_err:
+            # Not a partial result: zero findings here would read as a clean repo
+            logger.exception("Detection failed: %s", detect_err)
+            return {"repo_path": repo_path, "scan_failed": True}
+        findings.pop("_summary", None)  # summary is rebuilt by generate_summary
 
         # Build notice
         scan_notice = None
@@ -227,6 +227,22 @@ def _blocking_scan(repo_url: str):
         }
 
 
+async def _clone_and_scan(repo_url: str):
+    """
+    Clone → scan → detect pipeline.
+
+    The clone is awaited as async git subprocesses, so no worker thread sits
+    idle on the network; only the scan phase is offloaded to the executor.
+    Only raises if clone itself fails.
+    """
+    # ── STEP 1: Clone (this CAN raise) ──────────────────────────
+    repo_path = await clone_repo_async(repo_url)
+    logger.info("CLONE SUCCESS: %s", repo_url)
+
+    # ── STEP 2: Scan + detect (NEVER fails) ─────────────────────
+    return await asyncio.to_thread(_blocking_scan, repo_path)
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -255,10 +271,9 @@ async def analyze_repo(request: AnalyzeRequest):
 
     # ── CLONE PHASE (only this can return failure) ──────────────
     try:
-        loop = asyncio.get_event_loop()
         try:
             result = await asyncio.wait_for(
-                loop.run_in_executor(_executor, _blocking_scan, url),
+                _clone_and_scan(url),
                 timeout=CLONE_TIMEOUT_SECONDS,
             )
         except asyncio.TimeoutError:
@@ -278,8 +293,24 @@ async def analyze_repo(request: AnalyzeRequest):
     # ── POST-CLONE: result is GUARANTEED to be a valid dict ────
     try:
         repo_path = result["repo_path"]
+        if result.get("scan_failed"):
+            return JSONResponse(status_code=500, content={"error": SCAN_FAIL_MSG})
         files = result.get("files", [])
         findings = result.get("findings", {"secrets_detected": [], "sql_injection": [], "missing_auth": []})
+
+        # AI explanations run on the event loop (concurrent Groq calls) — graceful
+        # degradation. They share the request's time budget with clone + scan,
+        # so a long rate-limiter queue can't hold the response indefinitely.
+        # Findings are enriched in place, batch by batch, so a timeout keeps
+        # the explanations that already arrived
+        remaining = CLONE_TIMEOUT_SECONDS - (time.time() - start_time)
+        try:
+            await asyncio.wait_for(enhance_findings_with_ai(findings), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            logger.warning("AI explanation timed out, returning partially explained findings")
+        except Exception as ai_err:
+            logger.warning("AI explanation failed, returning raw findings: %s", ai_err)
+
         total_found = result.get("total_found", 0)
         was_truncated = result.get("was_truncated", False)
         scan_notice = result.get("scan_notice")
@@ -311,8 +342,37 @@ class FixRequest(BaseModel):
     vulnerability_type: str
     code_snippet: str
 
-# Simple in-memory cache  {hash -> fixed_code}
-_fix_cache: Dict[str, str] = {}
+# In-memory cache  {sha256(request) -> fixed_code}. Raw digests: no hex
+# encoding per request and half-size keys. SHA-256 stays — with SHA-NI it
+# outruns blake2b here, and key derivation is microseconds next to a Groq call.
+# Bounded + expiring so it can't grow for the life of the process; only
+# touched from the event loop, so it needs no lock.
+FIX_CACHE_SIZE = 1024
+FIX_CACHE_TTL_SECONDS = 3600
+_fix_cache: "TTLCache[bytes, str]" = TTLCache(maxsize=FIX_CACHE_SIZE, ttl=FIX_CACHE_TTL_SECONDS)
+
+# Prompt scaffolding, built once — handlers only fill in the request fields
+_FIX_SYSTEM_PROMPT = "You are a security engineer. Return only fixed code."
+_FIX_PROMPT_TEMPLATE = (
+    "Vulnerability type: {vuln_type}\n"
+    "Vulnerable code:\n```\n{snippet}\n```\n\n"
+    "Rewrite this code securely. Return only the fixed code, no explanation."
+)
+
+
+def _strip_fences(text: str) -> str:
+    """Drop a leading ```lang line and a closing ``` line, if the reply is fenced."""
+    if not text.startswith("```"):
+        return text
+    # Slice around the fence lines instead of splitting the reply into lines
+    newline = text.find("\n")
+    if newline == -1:
+        return ""
+    body = text[newline + 1:]
+    last_line = body.rfind("\n") + 1
+    if body[last_line:].strip() == "```":
+        body = body[:max(last_line - 1, 0)]
+    return body
 
 
 @app.post("/generate-fix")
@@ -325,9 +385,10 @@ async def generate_fix(request: FixRequest):
         return JSONResponse(status_code=400, content={"error": "No code snippet provided."})
 
     # Cache key
-    cache_key = hashlib.sha256(f"{vuln_type}::{snippet}".encode()).hexdigest()
-    if cache_key in _fix_cache:
-        return {"fixed_code": _fix_cache[cache_key], "cached": True}
+    cache_key = hashlib.sha256(f"{vuln_type}::{snippet}".encode()).digest()
+    cached = _fix_cache.get(cache_key)
+    if cached is not None:
+        return {"fixed_code": cached, "cached": True}
 
     if not _groq_client:
         return JSONResponse(
@@ -335,17 +396,13 @@ async def generate_fix(request: FixRequest):
             content={"fixed_code": "AI fix unavailable. Showing manual fix suggestion.", "cached": False},
         )
 
-    prompt = (
-        f"Vulnerability type: {vuln_type}\n"
-        f"Vulnerable code:\n```\n{snippet[:500]}\n```\n\n"
-        "Rewrite this code securely. Return only the fixed code, no explanation."
-    )
+    prompt = _FIX_PROMPT_TEMPLATE.format(vuln_type=vuln_type, snippet=snippet[:500])
 
     try:
-        response = _groq_client.chat.completions.create(
+        response = await _groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
-                {"role": "system", "content": "You are a security engineer. Return only fixed code."},
+                {"role": "system", "content": _FIX_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.2,
@@ -354,12 +411,7 @@ async def generate_fix(request: FixRequest):
         fixed_code = response.choices[0].message.content.strip()
 
         # Strip surrounding markdown fences if present
-        if fixed_code.startswith("```"):
-            lines = fixed_code.split("\n")
-            lines = lines[1:]  # remove opening ```lang
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            fixed_code = "\n".join(lines)
+        fixed_code = _strip_fences(fixed_code)
 
         _fix_cache[cache_key] = fixed_code
         return {"fixed_code": fixed_code, "cached": False}
@@ -385,6 +437,15 @@ class FixAllRequest(BaseModel):
     vulnerabilities: List[VulnItem]
 
 
+_FIX_ALL_SYSTEM_PROMPT = "You are a security engineer. Return only the corrected file code."
+_FIX_ALL_PROMPT_TEMPLATE = (
+    "File: {filename}\n\n"
+    "Vulnerabilities found:\n{vuln_list}\n\n"
+    "Rewrite this file securely. Fix all listed vulnerabilities. "
+    "Return only the full corrected file, no explanation."
+)
+
+
 @app.post("/fix-all")
 async def fix_all(request: FixAllRequest):
     """Rewrite an entire file securely, fixing all listed vulnerabilities."""
@@ -396,9 +457,10 @@ async def fix_all(request: FixAllRequest):
 
     # Cache key based on filename + all vulns
     raw = filename + "::" + "||".join(f"{v.type}:{v.line}:{v.code_snippet}" for v in vulns)
-    cache_key = hashlib.sha256(raw.encode()).hexdigest()
-    if cache_key in _fix_cache:
-        return {"fixed_file": _fix_cache[cache_key], "cached": True}
+    cache_key = hashlib.sha256(raw.encode()).digest()
+    cached = _fix_cache.get(cache_key)
+    if cached is not None:
+        return {"fixed_file": cached, "cached": True}
 
     if not _groq_client:
         return JSONResponse(
@@ -407,23 +469,18 @@ async def fix_all(request: FixAllRequest):
         )
 
     # Build vulnerability list for the prompt
-    vuln_lines = []
-    for v in vulns:
-        snippet = v.code_snippet[:200] if v.code_snippet else "(no snippet)"
-        vuln_lines.append(f"- Line {v.line}: {v.type} → {snippet}")
-
-    prompt = (
-        f"File: {filename}\n\n"
-        f"Vulnerabilities found:\n" + "\n".join(vuln_lines) + "\n\n"
-        "Rewrite this file securely. Fix all listed vulnerabilities. "
-        "Return only the full corrected file, no explanation."
+    vuln_list = "\n".join(
+        f"- Line {v.line}: {v.type} → {v.code_snippet[:200] if v.code_snippet else '(no snippet)'}"
+        for v in vulns
     )
 
+    prompt = _FIX_ALL_PROMPT_TEMPLATE.format(filename=filename, vuln_list=vuln_list)
+
     try:
-        response = _groq_client.chat.completions.create(
+        response = await _groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
-                {"role": "system", "content": "You are a security engineer. Return only the corrected file code."},
+                {"role": "system", "content": _FIX_ALL_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.2,
@@ -432,12 +489,7 @@ async def fix_all(request: FixAllRequest):
         fixed = response.choices[0].message.content.strip()
 
         # Strip markdown fences
-        if fixed.startswith("```"):
-            lines = fixed.split("\n")
-            lines = lines[1:]
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            fixed = "\n".join(lines)
+        fixed = _strip_fences(fixed)
 
         _fix_cache[cache_key] = fixed
         return {"fixed_file": fixed, "cached": False}
@@ -1,22 +1,28 @@
 import os
 import logging
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger("security-auditor")
 
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
-SUPPORTED_EXTENSIONS = {'.py', '.js', '.ts', '.jsx', '.tsx'}
+SUPPORTED_EXTENSIONS = frozenset({'.py', '.js', '.ts', '.jsx', '.tsx'})
 
 # Extensions to always skip (binary, minified, lock files, etc.)
-SKIP_EXTENSIONS = {
+SKIP_EXTENSIONS = frozenset({
     '.min.js', '.lock', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico',
     '.zip', '.tar', '.gz', '.bz2', '.7z', '.rar',
     '.pdf', '.map', '.woff', '.woff2', '.ttf', '.eot',
     '.pyc', '.pyo', '.so', '.dll', '.exe', '.bin',
     '.mp3', '.mp4', '.wav', '.avi', '.mov',
-}
+})
+
+# Lowercase suffix tuples for str.endswith fast paths in the tree walk
+_SUPPORTED_SUFFIXES = tuple(sorted(SUPPORTED_EXTENSIONS))
+_SKIP_SUFFIXES = tuple(sorted(SKIP_EXTENSIONS))
 
 # Directories to always skip
 IGNORED_DIRS = {
@@ -33,87 +39,205 @@ MAX_FILES_INITIAL = 150          # Files to actually read & scan
 MAX_TOTAL_FILES   = 800          # Max files to index in tree walk
 HARD_TREE_CAP     = 10_000       # Stop walking tree after this many entries
 MAX_FILE_SIZE     = 500 * 1024   # 500 KB per file — skip larger
+MAX_LINE_LENGTH   = 2000         # Longer lines mean minified/generated code — skip
+READ_WORKERS      = 8            # Threads reading files concurrently (I/O releases the GIL)
+READ_AHEAD        = 16           # Reads in flight per scan — bounds memory, keeps order
+
+# One reader pool for the whole process; its threads start on first use
+_read_pool = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="read")
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+def _is_scannable(content: str) -> bool:
+    """
+    False for content the line-based detectors shouldn't see: binary files
+    and minified/generated bundles (one huge line defeats per-line scanning).
+    """
+    if '\x00' in content:
+        return False
+    if len(content) <= MAX_LINE_LENGTH:
+        return True
+    # Hop from newline to newline rather than splitting out a list of lines;
+    # stop at the first line that is too long
+    start = 0
+    while True:
+        end = content.find('\n', start)
+        if end == -1:
+            return len(content) - start <= MAX_LINE_LENGTH
+        if end - start > MAX_LINE_LENGTH:
+            return False
+        start = end + 1
 
 
 # ---------------------------------------------------------------------------
 # Core scanner
 # ---------------------------------------------------------------------------
-def scan_files(repo_path: str) -> Dict[str, Any]:
+def _iter_tree(repo_path: str) -> Iterator[Tuple[str, List[str]]]:
     """
-    Walk the repo tree and collect code files.
+    Yield (rel_dir, filenames) for each directory, top-down, in os.walk order.
 
-    Returns:
-        {
-            "files":         List[Dict]   — up to MAX_FILES_INITIAL with content loaded,
-            "total_found":   int          — total code files discovered in the tree,
-            "was_truncated": bool         — True if we hit any limit,
-        }
+    Uses os.scandir directly: the file-vs-dir check comes from the readdir
+    entry type, and relative paths are built as we descend instead of via
+    os.path.relpath per file.
+    """
+    stack = [(repo_path, '')]
+    while stack:
+        abs_dir, rel_dir = stack.pop()
+        filenames: List[str] = []
+        subdirs = []
+        try:
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        filenames.append(entry.name)
+                    # Prune ignored directories; like os.walk, don't follow symlinks
+                    elif (entry.name not in IGNORED_DIRS
+                          and not entry.name.startswith('.')
+                          and not entry.is_symlink()):
+                        subdirs.append(entry.name)
+        except OSError:
+            continue  # unreadable directory — skip, as os.walk does
+
+        yield rel_dir, filenames
+
+        # Reversed so the first subdirectory is walked next (depth-first, in order)
+        for name in reversed(subdirs):
+            stack.append((os.path.join(abs_dir, name), os.path.join(rel_dir, name)))
+
+
+def _walk_code_paths(repo_path: str) -> Tuple[List[str], bool]:
+    """
+    Walk the repo tree and collect relative paths of code files (no content).
+
+    Returns (code_paths, hit_tree_cap).
     """
     code_paths: List[str] = []      # relative paths of ALL discovered code files
     tree_entries_seen = 0           # total fs entries walked (dirs + files)
     hit_tree_cap = False
 
-    # ── Phase 1: Walk tree, collect code-file paths (no content yet) ──
-    for root, dirs, filenames in os.walk(repo_path):
-        # Prune ignored directories IN-PLACE so os.walk won't descend
-        dirs[:] = [
-            d for d in dirs
-            if d not in IGNORED_DIRS and not d.startswith('.')
-        ]
-
+    for rel_dir, filenames in _iter_tree(repo_path):
         for filename in filenames:
             tree_entries_seen += 1
             if tree_entries_seen >= HARD_TREE_CAP:
                 hit_tree_cap = True
                 break
 
-            ext = os.path.splitext(filename)[1].lower()
+            # Fast paths on the raw name: extensions are nearly always lowercase
+            if filename.endswith(_SKIP_SUFFIXES):
+                continue  # heavy/binary/minified
+            if filename.endswith(_SUPPORTED_SUFFIXES):
+                # '.py' / '..py' have no extension as os.path.splitext sees it
+                if filename[0] == '.' and not filename[:filename.rfind('.')].strip('.'):
+                    continue
+            else:
+                # Anything else — e.g. 'MAIN.PY' — gets the case-insensitive check
+                dot = filename.rfind('.')
+                if dot <= 0 or (filename[0] == '.' and not filename[:dot].strip('.')):
+                    continue
+                ext = filename[dot:].lower()
+
+                # Skip heavy/binary extensions, then anything we don't scan
+                if ext in SKIP_EXTENSIONS or ext not in SUPPORTED_EXTENSIONS:
+                    continue
+                # Also skip .min.js specifically (double-extension check)
+                if ext == '.js' and filename.endswith('.min.js'):
+                    continue
+
+            code_paths.append(os.path.join(rel_dir, filename))
+
+            # Stop indexing beyond MAX_TOTAL_FILES
+            if len(code_paths) >= MAX_TOTAL_FILES:
+                hit_tree_cap = True
+                break
 
-            # Skip heavy/binary extensions
-            if ext in SKIP_EXTENSIONS:
-                continue
-            # Also skip .min.js specifically (double-extension check)
-            if filename.endswith('.min.js'):
-                continue
+        if hit_tree_cap:
+            break
 
-            if ext in SUPPORTED_EXTENSIONS:
-                filepath = os.path.join(root, filename)
-                rel = os.path.relpath(filepath, repo_path)
-                code_paths.append(rel)
+    return code_paths, hit_tree_cap
 
-                # Stop indexing beyond MAX_TOTAL_FILES
-                if len(code_paths) >= MAX_TOTAL_FILES:
-                    hit_tree_cap = True
-                    break
 
-        if hit_tree_cap:
-            break
+def _read_file(repo_path: str, rel_path: str) -> Optional[Dict]:
+    """Read one code file, or None if it is oversized, unreadable, binary or minified."""
+    abs_path = os.path.join(repo_path, rel_path)
+    try:
+        # Reading one byte past the limit tells oversized files apart without
+        # a separate stat() of the path
+        with open(abs_path, 'rb') as f:
+            data = f.read(MAX_FILE_SIZE + 1)
+        if len(data) > MAX_FILE_SIZE:
+            return None  # silently skip oversized files
+
+        # One bulk decode instead of TextIOWrapper's incremental decoding;
+        # newlines normalised as text mode would
+        content = data.decode('utf-8', errors='ignore')
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+        if not _is_scannable(content):
+            return None  # silently skip binary / minified files
+    except Exception:
+        return None
+
+    return {
+        'path': rel_path,
+        'content': content,
+        'extension': os.path.splitext(rel_path)[1].lower(),
+    }
+
+
+def iter_files(repo_path: str, rel_paths: Iterable[str]) -> Iterator[Dict]:
+    """
+    Read code files, yielding {path, content, extension} in `rel_paths` order.
+
+    Reads overlap on the shared reader pool (stat/open/read release the GIL,
+    so cold-cache clones read in parallel). At most READ_AHEAD reads are in
+    flight, so results stream out in order as the consumer asks for them.
+    Oversized, unreadable, binary and minified files are skipped silently.
+    """
+    pending: "deque[Future]" = deque()
+    try:
+        for rel_path in rel_paths:
+            pending.append(_read_pool.submit(_read_file, repo_path, rel_path))
+            if len(pending) >= READ_AHEAD:
+                file_info = pending.popleft().result()
+                if file_info is not None:
+                    yield file_info
+        while pending:
+            file_info = pending.popleft().result()
+            if file_info is not None:
+                yield file_info
+    finally:
+        # Consumer stopped early — drop the reads nobody will collect
+        for future in pending:
+            future.cancel()
+
+
+def scan_files(repo_path: str) -> Dict[str, Any]:
+    """
+    Walk the repo tree and collect code files.
+
+    Returns:
+        {
+            "files":         List[Dict]   — up to MAX_FILES_INITIAL with content loaded,
+            "total_found":   int          — total code files discovered in the tree,
+            "was_truncated": bool         — True if we hit any limit,
+        }
+    """
+    # ── Phase 1: Walk tree, collect code-file paths (no content yet) ──
+    code_paths, hit_tree_cap = _walk_code_paths(repo_path)
 
     total_found = len(code_paths)
     was_truncated = total_found > MAX_FILES_INITIAL or hit_tree_cap
 
     # ── Phase 2: Read content for the first MAX_FILES_INITIAL files ──
-    files_to_scan = code_paths[:MAX_FILES_INITIAL]
-    loaded: List[Dict] = []
-
-    for rel_path in files_to_scan:
-        abs_path = os.path.join(repo_path, rel_path)
-        try:
-            size = os.path.getsize(abs_path)
-            if size > MAX_FILE_SIZE:
-                continue  # silently skip oversized files
-
-            with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-
-            ext = os.path.splitext(rel_path)[1].lower()
-            loaded.append({
-                'path': rel_path,
-                'content': content,
-                'extension': ext,
-            })
-        except Exception:
-            continue
+    # (the three detectors each make a pass over them, so keep them in a list)
+    loaded: List[Dict] = list(iter_files(repo_path, code_paths[:MAX_FILES_INITIAL]))
 
     logger.info(
         "scan_files: total_found=%d, loaded=%d, truncated=%s",
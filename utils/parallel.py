@@ -0,0 +1,99 @@
+"""
+Process-pool fan-out for per-file detector work.
+
+Regex scanning holds the GIL, so threads can't spread a detector across
+cores; a long-lived process pool can. Files are independent, so each
+detector hands its per-file scan function to `map_files` (or, for
+per-file results that aren't a findings list, `map_each`).
+"""
+import os
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger("security-auditor")
+
+# Below this many files, pickling + IPC costs more than the pool saves
+PARALLEL_MIN_FILES = 32
+
+_CPU_COUNT = os.cpu_count() or 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Create the shared pool on first use (agents are called from several threads)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The server is multi-threaded, so don't fork() it — start workers
+            # from a clean forkserver (or spawn, where forkserver is unavailable)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            _pool = ProcessPoolExecutor(max_workers=_CPU_COUNT, mp_context=context)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next scan starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _map_pooled(scan_one: Callable[[Dict], T], files: List[Dict]) -> Iterator[T]:
+    """map_each over the process pool, finishing serially if the pool fails."""
+    done = 0
+    try:
+        pool = _get_pool()
+        chunksize = max(1, len(files) // (_CPU_COUNT * 4))
+        for result in pool.map(scan_one, files, chunksize=chunksize):
+            yield result
+            done += 1
+    except BrokenProcessPool as exc:
+        # A worker died (e.g. OOM-killed) — this pool can't run anything more
+        logger.warning("Process pool broke, scanning the remaining files serially: %s", exc)
+        _discard_pool(pool)
+    except (OSError, ImportError, NotImplementedError) as exc:
+        # No working multiprocessing here (e.g. no sem_open on serverless hosts)
+        logger.warning("Process pool unavailable, scanning serially: %s", exc)
+    yield from map(scan_one, files[done:])
+
+
+def map_each(scan_one: Callable[[Dict], T], files: List[Dict]) -> Iterator[T]:
+    """
+    Run `scan_one` over every file and yield its result per file, in file order.
+
+    Results stream out as each file (or pool chunk) finishes, so consumers
+    can start on them before the whole scan is done. `scan_one` must be a
+    module-level function so worker processes can import it. If the pool
+    can't be started or breaks mid-scan, the rest runs in this process.
+    """
+    if len(files) <= PARALLEL_MIN_FILES or _CPU_COUNT < 2:
+        return map(scan_one, files)
+    return _map_pooled(scan_one, files)
+
+
+def map_files(scan_one: Callable[[Dict], List[Dict]], files: List[Dict]) -> Iterator[Dict]:
+    """Run `scan_one` over every file and yield the findings, in file order (see map_each)."""
+    return itertools.chain.from_iterable(map_each(scan_one, files))
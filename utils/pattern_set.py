@@ -0,0 +1,244 @@
+"""
+Multi-pattern pre-filter for the detector agents.
+
+When google-re2 is installed, all of an agent's patterns are compiled into
+one RE2::Set and each file is scanned once, in linear time, to find which
+patterns can match anywhere in it. The matching patterns are then run over
+the whole file with RE2 to locate the lines they hit, and only those lines
+are handed back to the agent for its exact line-by-line `re` checks — the
+file is never split into a list of lines.
+
+Without re2 — and for non-ASCII content, where RE2's case folding and
+character classes differ from Python's — each pattern's trigger keywords
+(lowercase literals that any match must contain) are looked for in the
+case-folded file instead: a pattern is a candidate only if one of its
+triggers occurs, and only lines containing a trigger are yielded. With no
+triggers either, every pattern is a candidate and every line is yielded, so
+results are identical either way.
+
+A PatternSetGroup gates several agents' PatternSets with one such scan.
+"""
+import re
+from typing import Iterable, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+try:
+    import re2
+except ImportError:  # optional — falls back to scanning every pattern
+    re2 = None
+
+# Python's str `\s` also matches \v and \x1c-\x1f; RE2's `\s` does not
+_PY_SPACE_CHARS = r'\t\n\v\f\r \x1c-\x1f'
+
+# The only non-ASCII characters re.IGNORECASE matches against ASCII letters,
+# and which str.lower() doesn't map onto them (İ would also lengthen the string)
+_RE_CASE_FOLDS = (('\u0130', 'i'), ('\u0131', 'i'), ('\u017f', 's'), ('\u212a', 'k'))
+
+# RE2 memory budget for a PatternSetGroup's combined set. Its DFA states are
+# products of every agent's patterns, so text dense in several agents'
+# keywords at once thrashes RE2's default 8 MB cache; the memory is only
+# allocated as states are actually built
+GROUP_MAX_MEM = 64 << 20
+
+
+def _to_re2_syntax(pattern: Pattern) -> str:
+    """Translate a compiled `re` pattern into RE2 syntax matching the same (ASCII) lines."""
+    src = pattern.pattern
+    out = []
+    in_class = False
+    i = 0
+    while i < len(src):
+        ch = src[i]
+        if ch == '\\':
+            escape = src[i:i + 2]
+            if escape == r'\s':
+                out.append(_PY_SPACE_CHARS if in_class else f'[{_PY_SPACE_CHARS}]')
+            else:
+                out.append(escape)
+            i += 2
+            continue
+        if src.startswith('(?>', i) and not in_class:
+            # RE2 has no atomic groups; a plain group matches a superset
+            out.append('(?:')
+            i += 3
+            continue
+        if ch == '[' and not in_class:
+            in_class = True
+        elif ch == ']' and in_class:
+            in_class = False
+        out.append(ch)
+        i += 1
+
+    translated = ''.join(out)
+    if pattern.flags & re.IGNORECASE and not translated.startswith('(?i)'):
+        translated = '(?i)' + translated
+    return translated
+
+
+def _fold_case(content: str) -> str:
+    """Lowercase `content` so it contains every trigger an IGNORECASE match implies."""
+    if not content.isascii():
+        for char, letter in _RE_CASE_FOLDS:
+            if char in content:
+                content = content.replace(char, letter)
+    return content.lower()
+
+
+def _find_all(text: str, word: str) -> Iterator[int]:
+    """Start offsets of every occurrence of `word` in `text`."""
+    pos = text.find(word)
+    while pos != -1:
+        yield pos
+        pos = text.find(word, pos + 1)
+
+
+def _lines_at(content: str, hits: Iterable[int]) -> Iterator[Tuple[int, int, int]]:
+    """(line_num, start, end) of each distinct line containing a hit offset."""
+    line_num = 1
+    counted_to = 0
+    line_end = -1
+    for hit in sorted(set(hits)):
+        if hit <= line_end:
+            continue  # another hit on the line just yielded
+        line_num += content.count('\n', counted_to, hit)
+        counted_to = hit
+        line_start = content.rfind('\n', 0, hit) + 1
+        line_end = content.find('\n', hit)
+        if line_end == -1:
+            line_end = len(content)
+        yield line_num, line_start, line_end
+
+
+def _re2_options():
+    options = re2.Options()
+    options.never_nl = True  # agents match line by line
+    return options
+
+
+def _compile_set(translated: Iterable[str], options):
+    """One RE2::Set over already-translated patterns."""
+    pattern_set = re2.Set.SearchSet(options)
+    for pattern in translated:
+        pattern_set.Add(pattern)
+    pattern_set.Compile()
+    return pattern_set
+
+
+class PatternSet:
+    """Answers "which of these patterns can match in this text, and on which lines?"."""
+
+    def __init__(self, patterns: Sequence[Pattern],
+                 triggers: Optional[Sequence[Sequence[str]]] = None):
+        """
+        `triggers[i]` lists lowercase substrings at least one of which every
+        match of `patterns[i]` contains (used when re2 can't gate the content).
+        """
+        if triggers is not None and len(triggers) != len(patterns):
+            raise ValueError("triggers must have one entry per pattern")
+        self._all = list(range(len(patterns)))
+        self._triggers = triggers
+        self._translated = None
+        self._set = None
+        self._regexes = None
+
+        if re2 is None:
+            return
+
+        options = _re2_options()
+        self._translated = [_to_re2_syntax(pattern) for pattern in patterns]
+        self._set = _compile_set(self._translated, options)
+        self._regexes = [re2.compile(translated, options) for translated in self._translated]
+
+    def candidates(self, content: str) -> List[int]:
+        """Indexes (in table order) of patterns that may match in `content`."""
+        if self._set is not None and content.isascii():
+            return sorted(self._set.Match(content) or ())
+        if self._triggers is not None:
+            return self._triggered(_fold_case(content))
+        return self._all
+
+    def _triggered(self, lowered: str) -> List[int]:
+        """Indexes of patterns with a trigger in the case-folded content."""
+        return [
+            i for i, words in enumerate(self._triggers)
+            if any(word in lowered for word in words)
+        ]
+
+    def candidate_lines(self, content: str, indexes: Sequence[int]) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield (line_num, start, end) for each line where any of the patterns at
+        `indexes` may match; `content[start:end]` is the line without its newline.
+        """
+        if content.isascii() and self._regexes is not None:
+            # ASCII, so byte offsets are str offsets: RE2 gets the bytes once,
+            # skipping the wrapper's UTF-8 encode per pattern and its
+            # offset decoding per match. never_nl keeps every match inside
+            # a single line
+            data = content.encode('ascii')
+            yield from _lines_at(content, (
+                match.start()
+                for i in indexes
+                for match in self._regexes[i].finditer(data)
+            ))
+            return
+
+        if self._triggers is not None:
+            # Agents match line by line, so a trigger sits on every matching line
+            lowered = _fold_case(content)
+            words = {word for i in indexes for word in self._triggers[i]}
+            yield from _lines_at(content, (
+                hit for word in words for hit in _find_all(lowered, word)
+            ))
+            return
+
+        # Fallback — every line is a candidate
+        start = 0
+        for line_num, line in enumerate(content.split('\n'), 1):
+            end = start + len(line)
+            yield line_num, start, end
+            start = end + 1
+
+
+class PatternSetGroup:
+    """
+    Several PatternSets gated together: with re2, one RE2::Set holding every
+    set's patterns scans each file once instead of once per set; without it,
+    the file is case-folded once for all of their trigger checks.
+    """
+
+    def __init__(self, pattern_sets: Sequence[PatternSet]):
+        self._sets = list(pattern_sets)
+        self._set = None
+        self._owners: List[Tuple[int, int]] = []  # combined index -> (set, pattern)
+
+        if any(pattern_set._translated is None for pattern_set in self._sets):
+            return
+
+        translated = []
+        for n, pattern_set in enumerate(self._sets):
+            for i, pattern in enumerate(pattern_set._translated):
+                translated.append(pattern)
+                self._owners.append((n, i))
+        options = _re2_options()
+        options.max_mem = GROUP_MAX_MEM
+        self._set = _compile_set(translated, options)
+
+    def candidates(self, content: str) -> List[List[int]]:
+        """For each set, in order, what its `candidates(content)` would return."""
+        if self._set is not None and content.isascii():
+            per_set: List[List[int]] = [[] for _ in self._sets]
+            # Combined indexes run set by set, so each list comes out sorted
+            for hit in sorted(self._set.Match(content) or ()):
+                n, i = self._owners[hit]
+                per_set[n].append(i)
+            return per_set
+
+        lowered = None
+        per_set = []
+        for pattern_set in self._sets:
+            if pattern_set._triggers is None:
+                per_set.append(pattern_set._all)
+                continue
+            if lowered is None:
+                lowered = _fold_case(content)
+            per_set.append(pattern_set._triggered(lowered))
+        return per_set
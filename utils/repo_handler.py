@@ -1,15 +1,33 @@
+import asyncio
 import tempfile
 import subprocess
 import shutil
 import os
 import sys
+import time
 import logging
+from typing import List, Tuple
+
+from utils.file_scanner import IGNORED_DIRS, SUPPORTED_EXTENSIONS
 
 logger = logging.getLogger("security-auditor")
 
 # How long to wait for git clone before giving up (seconds)
 CLONE_TIMEOUT_SECONDS = 60
 
+def _any_case_glob(ext: str) -> str:
+    """'.py' -> '*.[pP][yY]' — the scanner matches extensions case-insensitively."""
+    return "*" + "".join(f"[{c.lower()}{c.upper()}]" if c.isalpha() else c for c in ext)
+
+
+# Sparse-checkout patterns (gitignore syntax): only the code files the
+# scanner reads are downloaded — skipped directories and dot-dirs never are
+SPARSE_PATTERNS = (
+    [_any_case_glob(ext) for ext in sorted(SUPPORTED_EXTENSIONS)]
+    + [f"!**/{d}/**" for d in sorted(IGNORED_DIRS)]
+    + ["!**/.*/**"]
+)
+
 # --- Error messages ---
 MSG_TOO_LARGE = "Repository too large for demo version. Please try a smaller repository."
 
@@ -29,53 +47,104 @@ def _kill_process_tree(pid: int) -> None:
             pass
 
 
-def clone_repo(repo_url: str) -> str:
+async def _run_git(cmd: List[str], env: dict, timeout: float) -> Tuple[int, str]:
     """
-    Clone a GitHub repository to a temporary directory using subprocess.
+    Run one git command as an asyncio subprocess, returning (returncode, stderr).
 
-    - Sets GIT_TERMINAL_PROMPT=0 so git never hangs waiting for credentials.
-    - Enforces a short timeout and kills the entire process tree on expiry.
-    - On ANY failure, raises RuntimeError (caller shows a single fallback msg).
+    Kills the whole process tree and raises RuntimeError if it outlives
+    `timeout`; if the awaiting task is cancelled, the tree is killed too.
     """
-    temp_dir = tempfile.mkdtemp(prefix="security_audit_")
-
-    env = os.environ.copy()
-    env["GIT_TERMINAL_PROMPT"] = "0"       # never prompt for password
-    env["GIT_ASKPASS"] = ""                 # disable askpass helpers too
-
-    cmd = ["git", "clone", "--depth", "1", repo_url, temp_dir]
-
-    # Use CREATE_NEW_PROCESS_GROUP on Windows so we can kill the tree
+    # Own process group / session so a timeout can kill git and its helpers
+    # (and only them)
     creation_flags = 0
     if sys.platform == "win32":
         creation_flags = subprocess.CREATE_NEW_PROCESS_GROUP
 
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
         env=env,
         creationflags=creation_flags,
+        start_new_session=sys.platform != "win32",
     )
 
     try:
-        stdout, stderr = proc.communicate(timeout=CLONE_TIMEOUT_SECONDS)
-    except subprocess.TimeoutExpired:
-        logger.warning("git clone timed out after %ds for %s", CLONE_TIMEOUT_SECONDS, repo_url)
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=max(timeout, 0))
+    except asyncio.TimeoutError:
         _kill_process_tree(proc.pid)
-        proc.wait()
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        await proc.wait()
         raise RuntimeError("Clone timed out")
+    except asyncio.CancelledError:
+        _kill_process_tree(proc.pid)
+        raise
+
+    return proc.returncode, stderr.decode(errors="replace")
+
+
+async def clone_repo_async(repo_url: str) -> str:
+    """
+    Clone a GitHub repository to a temporary directory without blocking a thread.
 
-    if proc.returncode != 0:
-        logger.info("git clone failed (exit %d): %s", proc.returncode, stderr.strip())
+    - Partial, sparse clone: only blobs matching SPARSE_PATTERNS are fetched.
+    - Sets GIT_TERMINAL_PROMPT=0 so git never hangs waiting for credentials.
+    - Enforces a short timeout (across all git steps) and kills the entire
+      process tree on expiry or cancellation.
+    - On ANY failure, raises RuntimeError (caller shows a single fallback msg).
+    """
+    temp_dir = tempfile.mkdtemp(prefix="security_audit_")
+
+    env = os.environ.copy()
+    env["GIT_TERMINAL_PROMPT"] = "0"       # never prompt for password
+    env["GIT_ASKPASS"] = ""                 # disable askpass helpers too
+
+    deadline = time.monotonic() + CLONE_TIMEOUT_SECONDS
+
+    try:
+        # 1. Commits + trees only — no file contents yet
+        returncode, stderr = await _run_git(
+            ["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout",
+             repo_url, temp_dir],
+            env, deadline - time.monotonic(),
+        )
+        if returncode != 0:
+            logger.info("git clone failed (exit %d): %s", returncode, stderr.strip())
+            raise RuntimeError("Clone failed")
+
+        # 2. Restrict the checkout to code files (older git: fall back to a full checkout)
+        returncode, stderr = await _run_git(
+            ["git", "-C", temp_dir, "sparse-checkout", "set", "--no-cone", *SPARSE_PATTERNS],
+            env, deadline - time.monotonic(),
+        )
+        if returncode != 0:
+            logger.info("git sparse-checkout unavailable, checking out everything: %s", stderr.strip())
+
+        # 3. Check out — fetches just the matching blobs in one batch
+        returncode, stderr = await _run_git(
+            ["git", "-C", temp_dir, "checkout"],
+            env, deadline - time.monotonic(),
+        )
+        if returncode != 0:
+            logger.info("git checkout failed (exit %d): %s", returncode, stderr.strip())
+            raise RuntimeError("Clone failed")
+
+    except RuntimeError as exc:
+        if "timed out" in str(exc):
+            logger.warning("git clone timed out after %ds for %s", CLONE_TIMEOUT_SECONDS, repo_url)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    except asyncio.CancelledError:
         shutil.rmtree(temp_dir, ignore_errors=True)
-        raise RuntimeError("Clone failed")
+        raise
 
     return temp_dir
 
 
+def clone_repo(repo_url: str) -> str:
+    """Blocking wrapper around clone_repo_async, for callers without an event loop."""
+    return asyncio.run(clone_repo_async(repo_url))
+
+
 def cleanup_repo(repo_path: str) -> None:
     """Remove the cloned repository directory."""
     if repo_path and os.path.exists(repo_path):